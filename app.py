@@ -4,20 +4,46 @@ Flask Backend Application
 Author: Collin Ewayero
 """
 
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, abort, g, has_request_context
+from flask.json.provider import JSONProvider
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import Integer, cast, event, func, insert, inspect as sa_inspect, literal, select, text, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import defer
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
+from flask_session import Session
+from flask_limiter import Limiter
+from jinja2 import FileSystemBytecodeCache
 from werkzeug.security import generate_password_hash, check_password_hash
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
 from datetime import datetime, timedelta
+from enum import IntEnum
 import os
+import pickle
 import secrets
-from functools import wraps
+from functools import lru_cache, wraps
+import click
+import orjson
+import redis
 
 # ============================================
 # APP CONFIGURATION
 # ============================================
+class OrjsonProvider(JSONProvider):
+    """Serve jsonify() through orjson; naive datetimes are emitted as UTC."""
+    
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, option=orjson.OPT_NAIVE_UTC | orjson.OPT_UTC_Z).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
 # --- FIND THIS LINE IN YOUR CODE ---
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 
 # --- PASTE THIS DIRECTLY BELOW IT ---
 uri = os.getenv("DATABASE_URL")
@@ -26,14 +52,92 @@ if uri and uri.startswith("postgres://"):
 
 app.config["SQLALCHEMY_DATABASE_URI"] = uri or "sqlite:///local.db" # Fallback for local testing
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+# Werkzeug method override for tests, e.g. 'pbkdf2:sha1:1000'; argon2id otherwise
+app.config["PASSWORD_HASH_METHOD"] = os.getenv("PASSWORD_HASH_METHOD")
+if uri and uri.startswith("postgresql"):
+    # Keep a warm Postgres pool; SQLite (including sqlite:// in tests) uses SQLAlchemy's defaults.
+    # Budget: each gunicorn worker has its own pool of up to pool_size + max_overflow = 30
+    # connections, so WEB_CONCURRENCY x 30 must stay below Postgres max_connections.
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+        "pool_size": 10,
+        "max_overflow": 20,
+        "pool_pre_ping": True,
+    }
 # ------------------------------------
 
+# Static files are fingerprinted below, so browsers may keep them for 30 days
+app.config["SEND_FILE_MAX_AGE_DEFAULT"] = 30 * 24 * 3600
+
+
+def static_mtime(filename):
+    try:
+        return int(os.stat(os.path.join(app.static_folder, filename)).st_mtime)
+    except OSError:
+        return None
+
+
+cached_static_mtime = lru_cache(maxsize=None)(static_mtime)
+
+
+@app.url_defaults
+def add_static_version(endpoint, values):
+    if endpoint == 'static' and 'filename' in values:
+        # Re-stat on every render in debug so edited assets get a new ?v=
+        version = (static_mtime if app.debug else cached_static_mtime)(values['filename'])
+        if version is not None:
+            values['v'] = version
+
+
+# Share compiled templates across workers and restarts. Without JINJA_CACHE_DIR,
+# Jinja picks a private per-user temp directory and verifies its ownership.
+app.jinja_env.bytecode_cache = FileSystemBytecodeCache(os.getenv("JINJA_CACHE_DIR"))
+
 # --- THEN YOUR DB INITIALIZATION FOLLOWS ---
 
-db = SQLAlchemy(app)
+# Loaded objects stay usable after commit instead of re-SELECTing on next access
+db = SQLAlchemy(app, session_options={'expire_on_commit': False})
 login_manager = LoginManager(app)
 login_manager.login_view = 'auth_page'
 
+# Flag likely N+1 patterns during local development by counting queries per request
+if os.getenv("FLASK_ENV") == "development":
+    @event.listens_for(Engine, 'before_cursor_execute')
+    def count_query(*args):
+        if has_request_context():
+            g.query_count = g.get('query_count', 0) + 1
+    
+    @app.after_request
+    def warn_on_query_count(response):
+        query_count = g.get('query_count', 0)
+        if query_count > DEV_QUERY_WARN_THRESHOLD:
+            app.logger.warning('%s %s issued %d SQL queries', request.method, request.path, query_count)
+        return response
+
+# Redis is optional: without REDIS_URL every cache lookup is a miss
+redis_url = os.getenv("REDIS_URL")
+cache = redis.Redis.from_url(redis_url) if redis_url else None
+
+# Keep sessions server-side when Redis is available, signed cookies otherwise
+if cache is not None:
+    app.config["SESSION_TYPE"] = "redis"
+    app.config["SESSION_REDIS"] = cache
+    # Only write the session back to Redis when it actually changes
+    app.config["SESSION_REFRESH_EACH_REQUEST"] = False
+    Session(app)
+
+
+def user_rate_key():
+    return str(current_user.get_id())
+
+
+# Per-user limits share Redis across workers; errors never block a request
+limiter = Limiter(
+    user_rate_key,
+    app=app,
+    storage_uri=redis_url or "memory://",
+    swallow_errors=True
+)
+
 # ============================================
 # CONSTANTS
 # ============================================
@@ -42,6 +146,21 @@ WELCOME_BONUS = 50   # 50 GC = $0.20 USD
 REFERRAL_BONUS = 250 # 250 GC = $1.00 USD
 DAILY_BONUS = 1      # 1 GC per day
 WEEKLY_BONUS = 10    # 10 GC on day 7
+AVATAR_URL_PREFIX = 'https://i.pravatar.cc/300?u='
+
+# argon2id at the OWASP baseline (19 MiB, t=2, p=1): a few tens of ms per hash
+password_hasher = PasswordHasher(time_cost=2, memory_cost=19456, parallelism=1)
+
+LEADERBOARD_CACHE_KEY = 'leaderboard:top100'
+LEADERBOARD_CACHE_TTL = 45  # seconds
+USER_CACHE_TTL = 300        # seconds
+TASKS_CACHE_KEY = 'tasks:active:v1'
+SHOP_CACHE_KEY = 'shop:items:v1'
+CATALOG_CACHE_TTL = 60      # seconds, also sent as Cache-Control max-age
+CATALOG_ENTRY_TTL = 300     # seconds, caps staleness after edits made outside the app
+DAILY_CLAIM_GATE_TTL = 24 * 3600
+WRITE_RATE_LIMIT = "10/minute"
+DEV_QUERY_WARN_THRESHOLD = 10  # queries per request before warning (FLASK_ENV=development)
 
 # ============================================
 # DATABASE MODELS
@@ -63,15 +182,37 @@ class User(UserMixin, db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relationships
+    # Kept lazy: nothing serializes these, and selectin would load a user's whole
+    # ledger on every load_user. Eager-load per query (selectinload) where traversed.
     transactions = db.relationship('Transaction', backref='user', lazy=True, cascade='all, delete-orphan')
     completed_tasks = db.relationship('UserTask', backref='user', lazy=True, cascade='all, delete-orphan')
     purchases = db.relationship('Purchase', backref='user', lazy=True, cascade='all, delete-orphan')
     
+    __table_args__ = (db.Index('ix_user_balance', balance.desc()),)
+    
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        method = app.config['PASSWORD_HASH_METHOD']
+        if method:
+            self.password_hash = generate_password_hash(password, method=method)
+        else:
+            self.password_hash = password_hasher.hash(password)
     
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        # Hashes created before the argon2 switch are still Werkzeug format
+        if not self.password_hash.startswith('$argon2'):
+            return check_password_hash(self.password_hash, password)
+        try:
+            return password_hasher.verify(self.password_hash, password)
+        except (VerificationError, InvalidHashError):
+            return False
+    
+    def password_needs_rehash(self):
+        # Legacy Werkzeug hashes and outdated argon2 parameters are upgraded on login
+        if app.config['PASSWORD_HASH_METHOD']:
+            return False
+        if not self.password_hash.startswith('$argon2'):
+            return True
+        return password_hasher.check_needs_rehash(self.password_hash)
     
     def to_dict(self):
         return {
@@ -87,26 +228,32 @@ class User(UserMixin, db.Model):
         }
 
 
+class TransactionType(IntEnum):
+    EARN = 1
+    SPEND = 2
+    BONUS = 3
+    REFERRAL = 4
+    ADMIN = 5
+
+
+TRANSACTION_TYPE_CHECK = f"type IN ({', '.join(str(int(t)) for t in TransactionType)})"
+
+
 class Transaction(db.Model):
     __tablename__ = 'transactions'
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     amount = db.Column(db.Integer, nullable=False)
-    type = db.Column(db.String(20), nullable=False)  # earn, spend, bonus, referral, admin
+    type = db.Column(db.SmallInteger, nullable=False)  # TransactionType
     description = db.Column(db.String(255), nullable=False)
     balance_after = db.Column(db.Integer, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'type': 'EARN' if self.amount > 0 else 'SPEND',
-            'amount': abs(self.amount),
-            'description': self.description,
-            'timestamp': self.created_at.strftime('%Y-%m-%d %H:%M'),
-            'status': 'COMPLETED'
-        }
+    __table_args__ = (
+        db.Index('ix_txn_user_created', user_id, created_at.desc()),
+        db.CheckConstraint(TRANSACTION_TYPE_CHECK, name='ck_txn_type'),
+    )
 
 
 class Task(db.Model):
@@ -124,15 +271,10 @@ class Task(db.Model):
     # Relationships
     completions = db.relationship('UserTask', backref='task', lazy=True, cascade='all, delete-orphan')
     
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'title': self.title,
-            'description': self.description,
-            'type': self.type,
-            'reward': self.reward_amount,
-            'requiresVerification': self.requires_verification
-        }
+    __table_args__ = (
+        db.Index('ix_task_active', is_active),
+        db.Index('uq_tasks_title', title, unique=True),
+    )
 
 
 class UserTask(db.Model):
@@ -162,16 +304,10 @@ class ShopItem(db.Model):
     # Relationships
     purchases = db.relationship('Purchase', backref='item', lazy=True)
     
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'title': self.title,
-            'description': self.description,
-            'price': self.price,
-            'category': self.category,
-            'imageUrl': self.image_url,
-            'sellerId': 'official'
-        }
+    __table_args__ = (
+        db.Index('ix_shop_active', is_active),
+        db.Index('uq_shop_items_title', title, unique=True),
+    )
 
 
 class Purchase(db.Model):
@@ -186,12 +322,167 @@ class Purchase(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 
+# ============================================
+# BALANCE HELPERS
+# ============================================
+def apply_balance_change(user_id, amount, tx_type, description, *conditions, **values):
+    """Adjust a balance and log it without loading the row first.
+    
+    The UPDATE only applies when ``conditions`` still hold, so concurrent
+    requests cannot double-apply it. Returns the new balance, or None if
+    nothing was updated.
+    """
+    new_balance = db.session.execute(
+        update(User)
+        .where(User.id == user_id, *conditions)
+        .values(balance=User.balance + amount, **values)
+        .returning(User.balance)
+        .execution_options(synchronize_session='fetch')
+    ).scalar()
+    
+    if new_balance is None:
+        return None
+    
+    db.session.execute(insert(Transaction).values(
+        user_id=user_id,
+        amount=amount,
+        type=tx_type,
+        description=description,
+        balance_after=new_balance
+    ))
+    return new_balance
+
+
 # ============================================
 # LOGIN MANAGER
 # ============================================
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    key = f'user:{user_id}'
+    cached = cache_get(key)
+    if cached is not None:
+        # Re-attach without a SELECT so route mutations are still flushed
+        return db.session.merge(pickle.loads(cached), load=False)
+    
+    # Leave the password hash out of the cached copy; it loads on access if ever needed
+    user = db.session.execute(
+        select(User).options(defer(User.password_hash)).where(User.id == int(user_id))
+    ).scalar()
+    if user is not None:
+        cache_set(key, pickle.dumps(user), USER_CACHE_TTL)
+    return user
+
+
+# ============================================
+# CACHE HELPERS
+# ============================================
+def cache_get(key):
+    if cache is None:
+        return None
+    try:
+        return cache.get(key)
+    except redis.RedisError:
+        return None
+
+
+def cache_set(key, value, ttl):
+    if cache is None:
+        return
+    try:
+        cache.setex(key, ttl, value)
+    except redis.RedisError:
+        pass
+
+
+def cache_add(key, ttl):
+    # SET NX EX; True if the key was newly set or Redis is unavailable
+    if cache is None:
+        return True
+    try:
+        return bool(cache.set(key, 1, nx=True, ex=ttl))
+    except redis.RedisError:
+        return True
+
+
+def cache_delete(*keys):
+    if cache is None:
+        return
+    try:
+        cache.delete(*keys)
+    except redis.RedisError:
+        pass
+
+
+def cache_delete_matching(*patterns):
+    # SCAN rather than KEYS so a large keyspace doesn't block Redis
+    if cache is None:
+        return
+    try:
+        for pattern in patterns:
+            keys = list(cache.scan_iter(match=pattern, count=500))
+            if keys:
+                cache.delete(*keys)
+    except redis.RedisError:
+        pass
+
+
+def invalidate_leaderboard():
+    cache_delete(LEADERBOARD_CACHE_KEY)
+
+
+def invalidate_catalog():
+    # Call after any change to tasks or shop items, alongside warm_catalog_cache()
+    cache_delete(TASKS_CACHE_KEY, SHOP_CACHE_KEY)
+    # Per-entry keys too, including ids that no longer exist
+    cache_delete_matching(*(f'{model.__tablename__}:*' for model in (Task, ShopItem)))
+
+
+def catalog_entry_columns(model):
+    # Just the fields the write endpoints read
+    if model is Task:
+        return (Task.id, Task.title, Task.reward_amount)
+    return (ShopItem.id, ShopItem.title, ShopItem.price)
+
+
+def cache_catalog_entry(model, entry):
+    cache_set(f'{model.__tablename__}:{entry["id"]}', orjson.dumps(entry), CATALOG_ENTRY_TTL)
+
+
+def get_catalog_entry_or_404(model, entry_id):
+    """Look up a task or shop item as a dict, from Redis when cached."""
+    cached = cache_get(f'{model.__tablename__}:{entry_id}')
+    if cached is not None:
+        return orjson.loads(cached)
+    
+    row = db.session.execute(
+        select(*catalog_entry_columns(model)).where(model.id == entry_id)
+    ).mappings().first()
+    if row is None:
+        abort(404)
+    
+    entry = dict(row)
+    cache_catalog_entry(model, entry)
+    return entry
+
+
+def warm_catalog_cache():
+    # Call after any change to tasks or shop items, alongside invalidate_catalog()
+    for model in (Task, ShopItem):
+        for row in db.session.execute(select(*catalog_entry_columns(model))).mappings():
+            cache_catalog_entry(model, dict(row))
+
+
+def invalidate_user(user_id):
+    # A user's balance feeds the leaderboard, so drop both in one round-trip
+    cache_delete(f'user:{user_id}', LEADERBOARD_CACHE_KEY)
+
+
+@login_manager.unauthorized_handler
+def unauthorized():
+    # API callers get JSON they can act on; pages still redirect to sign-in
+    if request.path.startswith('/api/'):
+        return jsonify({'success': False, 'message': 'Authentication required'}), 401
+    return redirect(url_for('auth_page', next=request.path))
 
 
 # ============================================
@@ -206,6 +497,11 @@ def admin_required(f):
     return decorated_function
 
 
+@app.errorhandler(429)
+def rate_limited(e):
+    return jsonify({'success': False, 'message': 'Too many requests. Please slow down.'}), 429
+
+
 # ============================================
 # ROUTES - PAGES
 # ============================================
@@ -279,21 +575,24 @@ def admin_page():
 def signup():
     data = request.get_json()
     
-    if User.query.filter_by(email=data['email']).first():
+    if db.session.execute(select(1).where(User.email == data['email']).limit(1)).first():
         return jsonify({'success': False, 'message': 'Email already registered'}), 400
     
-    if User.query.filter_by(username=data['username']).first():
+    if db.session.execute(select(1).where(User.username == data['username']).limit(1)).first():
         return jsonify({'success': False, 'message': 'Username already taken'}), 400
     
     user = User(
         username=data['username'],
-        email=data['email'],
-        avatar_url=f"https://i.pravatar.cc/300?u={data['email']}"
+        email=data['email']
     )
     user.set_password(data['password'])
     
     db.session.add(user)
+    # Key the avatar on the id, not the email: the leaderboard shows it to everyone
+    db.session.flush()
+    user.avatar_url = AVATAR_URL_PREFIX + str(user.id)
     db.session.commit()
+    invalidate_leaderboard()
     
     login_user(user, remember=True)
     
@@ -313,6 +612,11 @@ def login():
     if not user or not user.check_password(data['password']):
         return jsonify({'success': False, 'message': 'Invalid email or password'}), 401
     
+    if user.password_needs_rehash():
+        user.set_password(data['password'])
+        db.session.commit()
+        cache_delete(f'user:{user.id}')
+    
     login_user(user, remember=True)
     
     return jsonify({
@@ -344,34 +648,35 @@ def claim_welcome_bonus():
     if current_user.has_claimed_welcome:
         return jsonify({'success': False, 'message': 'Welcome bonus already claimed'}), 400
     
-    current_user.balance += WELCOME_BONUS
-    current_user.has_claimed_welcome = True
-    
-    transaction = Transaction(
-        user_id=current_user.id,
-        amount=WELCOME_BONUS,
-        type='bonus',
-        description='Welcome Bonus',
-        balance_after=current_user.balance
+    user_id = current_user.id
+    new_balance = apply_balance_change(
+        user_id, WELCOME_BONUS, TransactionType.BONUS, 'Welcome Bonus',
+        User.has_claimed_welcome.is_(False),
+        has_claimed_welcome=True
     )
     
-    db.session.add(transaction)
+    if new_balance is None:
+        return jsonify({'success': False, 'message': 'Welcome bonus already claimed'}), 400
+    
     db.session.commit()
+    invalidate_user(user_id)
     
     return jsonify({
         'success': True,
         'message': f'Welcome bonus claimed! +{WELCOME_BONUS} GC',
-        'new_balance': current_user.balance
+        'new_balance': new_balance
     })
 
 
 @app.route('/api/user/claim-daily', methods=['POST'])
 @login_required
+@limiter.limit(WRITE_RATE_LIMIT)
 def claim_daily_bonus():
     now = datetime.utcnow()
+    last_claim = current_user.last_daily_claim
     
-    if current_user.last_daily_claim:
-        time_since_last = now - current_user.last_daily_claim
+    if last_claim:
+        time_since_last = now - last_claim
         
         if time_since_last.total_seconds() < 24 * 3600:
             return jsonify({
@@ -381,35 +686,53 @@ def claim_daily_bonus():
         
         # Check if streak continues (within 48 hours)
         if time_since_last.total_seconds() < 48 * 3600:
-            current_user.daily_streak += 1
+            streak = current_user.daily_streak + 1
         else:
-            current_user.daily_streak = 1
+            streak = 1
     else:
-        current_user.daily_streak = 1
+        streak = 1
     
     # Reward: 10 GC on day 7, 1 GC otherwise
-    amount = WEEKLY_BONUS if current_user.daily_streak % 7 == 0 else DAILY_BONUS
+    amount = WEEKLY_BONUS if streak % 7 == 0 else DAILY_BONUS
     
-    current_user.balance += amount
-    current_user.last_daily_claim = now
-    
-    transaction = Transaction(
-        user_id=current_user.id,
-        amount=amount,
-        type='bonus',
-        description=f'Daily Login Bonus (Day {current_user.daily_streak})',
-        balance_after=current_user.balance
-    )
+    # Turn away duplicate claims in Redis before they reach the database
+    user_id = current_user.id
+    gate_key = f'daily-claim:{user_id}'
+    if not cache_add(gate_key, DAILY_CLAIM_GATE_TTL):
+        return jsonify({
+            'success': False,
+            'message': 'Daily bonus not ready yet'
+        }), 400
     
-    db.session.add(transaction)
-    db.session.commit()
+    # Release the gate unless the claim is committed, or a failed write locks the user out
+    try:
+        # Only apply if no other request has claimed since we read last_claim
+        new_balance = apply_balance_change(
+            user_id, amount, TransactionType.BONUS, f'Daily Login Bonus (Day {streak})',
+            User.last_daily_claim.is_(None) if last_claim is None else User.last_daily_claim == last_claim,
+            daily_streak=streak,
+            last_daily_claim=now
+        )
+        
+        if new_balance is None:
+            cache_delete(gate_key)
+            return jsonify({
+                'success': False,
+                'message': 'Daily bonus not ready yet'
+            }), 400
+        
+        db.session.commit()
+    except Exception:
+        cache_delete(gate_key)
+        raise
+    invalidate_user(user_id)
     
     return jsonify({
         'success': True,
-        'message': f'Claimed {amount} GC! Streak: {current_user.daily_streak} days',
+        'message': f'Claimed {amount} GC! Streak: {streak} days',
         'amount': amount,
-        'streak': current_user.daily_streak,
-        'new_balance': current_user.balance
+        'streak': streak,
+        'new_balance': new_balance
     })
 
 
@@ -419,46 +742,58 @@ def claim_daily_bonus():
 @app.route('/api/tasks', methods=['GET'])
 @login_required
 def get_tasks():
-    tasks = Task.query.filter_by(is_active=True).all()
-    return jsonify({
-        'success': True,
-        'tasks': [task.to_dict() for task in tasks]
-    })
+    body = cache_get(TASKS_CACHE_KEY)
+    if body is None:
+        rows = db.session.execute(
+            select(Task.id, Task.title, Task.description, Task.type, Task.reward_amount, Task.requires_verification)
+            .filter_by(is_active=True)
+        ).all()
+        
+        tasks = [{
+            'id': task_id,
+            'title': title,
+            'description': description,
+            'type': task_type,
+            'reward': reward_amount,
+            'requiresVerification': requires_verification
+        } for task_id, title, description, task_type, reward_amount, requires_verification in rows]
+        
+        body = orjson.dumps({
+            'success': True,
+            'tasks': tasks
+        })
+        cache_set(TASKS_CACHE_KEY, body, CATALOG_CACHE_TTL)
+    
+    response = app.response_class(body, mimetype='application/json')
+    response.headers['Cache-Control'] = f'private, max-age={CATALOG_CACHE_TTL}'
+    return response
 
 
 @app.route('/api/tasks/<int:task_id>/complete', methods=['POST'])
 @login_required
+@limiter.limit(WRITE_RATE_LIMIT)
 def complete_task(task_id):
-    task = Task.query.get_or_404(task_id)
+    task = get_catalog_entry_or_404(Task, task_id)
+    user_id = current_user.id
     
     # Check if already completed
-    if UserTask.query.filter_by(user_id=current_user.id, task_id=task_id).first():
+    already_completed = db.session.execute(
+        select(1).where(UserTask.user_id == user_id, UserTask.task_id == task_id).limit(1)
+    ).first()
+    if already_completed:
         return jsonify({'success': False, 'message': 'Task already completed'}), 400
     
-    # Credit coins
-    current_user.balance += task.reward_amount
-    
-    # Record completion
-    user_task = UserTask(user_id=current_user.id, task_id=task_id)
-    
-    # Record transaction
-    transaction = Transaction(
-        user_id=current_user.id,
-        amount=task.reward_amount,
-        type='earn',
-        description=f'Task: {task.title}',
-        balance_after=current_user.balance
-    )
-    
-    db.session.add(user_task)
-    db.session.add(transaction)
+    # Record completion, credit coins and record transaction in one flush
+    db.session.execute(insert(UserTask).values(user_id=user_id, task_id=task_id))
+    new_balance = apply_balance_change(user_id, task['reward_amount'], TransactionType.EARN, f"Task: {task['title']}")
     db.session.commit()
+    invalidate_user(user_id)
     
     return jsonify({
         'success': True,
-        'message': f'Earned +{task.reward_amount} GC',
-        'amount': task.reward_amount,
-        'new_balance': current_user.balance
+        'message': f"Earned +{task['reward_amount']} GC",
+        'amount': task['reward_amount'],
+        'new_balance': new_balance
     })
 
 
@@ -468,56 +803,74 @@ def complete_task(task_id):
 @app.route('/api/shop/items', methods=['GET'])
 @login_required
 def get_shop_items():
-    items = ShopItem.query.filter_by(is_active=True).all()
-    return jsonify({
-        'success': True,
-        'items': [item.to_dict() for item in items]
-    })
+    body = cache_get(SHOP_CACHE_KEY)
+    if body is None:
+        rows = db.session.execute(
+            select(ShopItem.id, ShopItem.title, ShopItem.description, ShopItem.price, ShopItem.category, ShopItem.image_url)
+            .filter_by(is_active=True)
+        ).all()
+        
+        items = [{
+            'id': item_id,
+            'title': title,
+            'description': description,
+            'price': price,
+            'category': category,
+            'imageUrl': image_url,
+            'sellerId': 'official'
+        } for item_id, title, description, price, category, image_url in rows]
+        
+        body = orjson.dumps({
+            'success': True,
+            'items': items
+        })
+        cache_set(SHOP_CACHE_KEY, body, CATALOG_CACHE_TTL)
+    
+    response = app.response_class(body, mimetype='application/json')
+    response.headers['Cache-Control'] = f'private, max-age={CATALOG_CACHE_TTL}'
+    return response
 
 
 @app.route('/api/shop/purchase/<int:item_id>', methods=['POST'])
 @login_required
+@limiter.limit(WRITE_RATE_LIMIT)
 def purchase_item(item_id):
     data = request.get_json()
     quantity = data.get('quantity', 1)
     
-    item = ShopItem.query.get_or_404(item_id)
-    total_price = item.price * quantity
+    item = get_catalog_entry_or_404(ShopItem, item_id)
+    total_price = item['price'] * quantity
+    
+    # Debit only if funds are still sufficient when the UPDATE runs
+    user_id = current_user.id
+    new_balance = apply_balance_change(
+        user_id, -total_price, TransactionType.SPEND, f"Purchased: {item['title']}",
+        User.balance >= total_price
+    )
     
-    if current_user.balance < total_price:
+    if new_balance is None:
+        # current_user may predate a concurrent debit, so report the committed balance
+        balance = db.session.execute(select(User.balance).where(User.id == user_id)).scalar()
         return jsonify({
             'success': False,
-            'message': f'Insufficient balance. Need {total_price - current_user.balance} more GC'
+            'message': f'Insufficient balance. Need {total_price - balance} more GC'
         }), 400
     
-    # Deduct balance
-    current_user.balance -= total_price
-    
     # Record purchase
-    purchase = Purchase(
-        user_id=current_user.id,
+    db.session.execute(insert(Purchase).values(
+        user_id=user_id,
         item_id=item_id,
         quantity=quantity,
         total_price=total_price
-    )
-    
-    # Record transaction
-    transaction = Transaction(
-        user_id=current_user.id,
-        amount=-total_price,
-        type='spend',
-        description=f'Purchased: {item.title}',
-        balance_after=current_user.balance
-    )
+    ))
     
-    db.session.add(purchase)
-    db.session.add(transaction)
     db.session.commit()
+    invalidate_user(user_id)
     
     return jsonify({
         'success': True,
         'message': 'Purchase successful!',
-        'new_balance': current_user.balance
+        'new_balance': new_balance
     })
 
 
@@ -527,14 +880,25 @@ def purchase_item(item_id):
 @app.route('/api/transactions', methods=['GET'])
 @login_required
 def get_transactions():
-    transactions = Transaction.query.filter_by(user_id=current_user.id)\
-        .order_by(Transaction.created_at.desc())\
-        .limit(50)\
-        .all()
+    rows = db.session.execute(
+        select(Transaction.id, Transaction.amount, Transaction.description, Transaction.created_at)
+        .filter_by(user_id=current_user.id)
+        .order_by(Transaction.created_at.desc())
+        .limit(50)
+    ).all()
+    
+    transactions = [{
+        'id': tx_id,
+        'type': 'EARN' if amount > 0 else 'SPEND',
+        'amount': abs(amount),
+        'description': description,
+        'timestamp': created_at.strftime('%Y-%m-%d %H:%M'),
+        'status': 'COMPLETED'
+    } for tx_id, amount, description, created_at in rows]
     
     return jsonify({
         'success': True,
-        'transactions': [tx.to_dict() for tx in transactions]
+        'transactions': transactions
     })
 
 
@@ -544,22 +908,31 @@ def get_transactions():
 @app.route('/api/leaderboard', methods=['GET'])
 @login_required
 def get_leaderboard():
-    users = User.query.order_by(User.balance.desc()).limit(100).all()
-    
-    leaderboard = []
-    for idx, user in enumerate(users, 1):
-        leaderboard.append({
-            'rank': idx,
-            'username': user.username,
-            'coins': user.balance,
-            'avatarUrl': user.avatar_url or f'https://i.pravatar.cc/150?u={user.id}',
-            'trend': 'same'
-        })
+    cached = cache_get(LEADERBOARD_CACHE_KEY)
+    if cached is not None:
+        return app.response_class(cached, mimetype='application/json')
     
-    return jsonify({
+    rows = db.session.execute(
+        select(User.id, User.username, User.balance, User.avatar_url)
+        .order_by(User.balance.desc())
+        .limit(100)
+    ).all()
+    
+    leaderboard = [{
+        'rank': idx,
+        'username': username,
+        'coins': balance,
+        'avatarUrl': avatar_url or f'{AVATAR_URL_PREFIX}{user_id}',
+        'trend': 'same'
+    } for idx, (user_id, username, balance, avatar_url) in enumerate(rows, 1)]
+    
+    body = orjson.dumps({
         'success': True,
         'leaderboard': leaderboard
     })
+    cache_set(LEADERBOARD_CACHE_KEY, body, LEADERBOARD_CACHE_TTL)
+    
+    return app.response_class(body, mimetype='application/json')
 
 
 # ============================================
@@ -568,69 +941,148 @@ def get_leaderboard():
 @app.route('/api/admin/mint', methods=['POST'])
 @login_required
 @admin_required
+@limiter.limit(WRITE_RATE_LIMIT)
 def admin_mint_coins():
     data = request.get_json()
     amount = data.get('amount', 1000)
     
-    current_user.balance += amount
-    
-    transaction = Transaction(
-        user_id=current_user.id,
-        amount=amount,
-        type='admin',
-        description='Admin Mint',
-        balance_after=current_user.balance
-    )
-    
-    db.session.add(transaction)
+    user_id = current_user.id
+    new_balance = apply_balance_change(user_id, amount, TransactionType.ADMIN, 'Admin Mint')
     db.session.commit()
+    invalidate_user(user_id)
     
     return jsonify({
         'success': True,
         'message': f'Minted {amount} GC',
-        'new_balance': current_user.balance
+        'new_balance': new_balance
     })
 
 
 # ============================================
 # INITIALIZE DATABASE
 # ============================================
+def insert_ignore(model):
+    """INSERT that skips rows violating a unique constraint (ON CONFLICT DO NOTHING)."""
+    dialect = postgresql if db.engine.dialect.name == 'postgresql' else sqlite
+    return dialect.insert(model).on_conflict_do_nothing()
+
+
+def migrate_transaction_types():
+    """Convert a legacy VARCHAR transactions.type column to SMALLINT (PostgreSQL only)."""
+    if db.engine.dialect.name != 'postgresql':
+        return
+    
+    columns = {c['name']: c['type'] for c in sa_inspect(db.engine).get_columns('transactions')}
+    if isinstance(columns['type'], Integer):
+        return
+    
+    cases = ' '.join(f"WHEN '{t.name.lower()}' THEN {int(t)}" for t in TransactionType)
+    db.session.execute(text(
+        f"ALTER TABLE transactions ALTER COLUMN type TYPE SMALLINT USING CASE type {cases} END"
+    ))
+    db.session.execute(text(
+        f"ALTER TABLE transactions ADD CONSTRAINT ck_txn_type CHECK ({TRANSACTION_TYPE_CHECK})"
+    ))
+
+
+def migrate_indexes():
+    """Build the lookup indexes on tables created before they were declared."""
+    connection = db.session.connection()
+    for model in (User, Transaction, Task, ShopItem):
+        for index in model.__table__.indexes:
+            # Unique title indexes need duplicates checked first (migrate_catalog_titles)
+            if not index.unique:
+                index.create(connection, checkfirst=True)
+
+
+def migrate_catalog_titles():
+    """Add the title unique indexes to catalog tables created before they existed.
+    
+    Duplicate titles (from earlier reseeding) may have completions or purchases
+    attached, so they are listed for manual resolution instead of being merged.
+    """
+    duplicates = []
+    for model in (Task, ShopItem):
+        duplicate_titles = (
+            select(model.title)
+            .group_by(model.title)
+            .having(func.count() > 1)
+        )
+        rows = db.session.execute(
+            select(model.title, model.id)
+            .where(model.title.in_(duplicate_titles))
+            .order_by(model.title, model.id)
+        ).all()
+        duplicates += [f'{model.__tablename__} #{entry_id}: {title}' for title, entry_id in rows]
+    
+    if duplicates:
+        raise click.ClickException(
+            'Duplicate catalog titles must be resolved before init-db can continue:\n  '
+            + '\n  '.join(duplicates)
+        )
+    
+    for model in (Task, ShopItem):
+        db.session.execute(text(
+            f"CREATE UNIQUE INDEX IF NOT EXISTS uq_{model.__tablename__}_title ON {model.__tablename__} (title)"
+        ))
+
+
 def init_db():
     with app.app_context():
         db.create_all()
+        migrate_transaction_types()
+        migrate_indexes()
+        migrate_catalog_titles()
         
-        # Create seed tasks if none exist
-        if Task.query.count() == 0:
-            tasks = [
-                Task(title='Watch 30s Video Ad', description='Watch a short advertisement', type='VIDEO', reward_amount=10),
-                Task(title='Install Partner App', description='Download and open our partner app', type='CPA', reward_amount=500, requires_verification=True),
-                Task(title='Complete Survey', description='Share your opinion in 5 minutes', type='SURVEY', reward_amount=50),
-                Task(title='Sign up for Newsletter', description='Subscribe to partner newsletter', type='CPA', reward_amount=100, requires_verification=True),
-                Task(title='Watch Premium Ad', description='Watch 60-second premium content', type='VIDEO', reward_amount=20),
-                Task(title='Install Game App', description='Install and reach level 5', type='CPA', reward_amount=1000, requires_verification=True),
-                Task(title='Quick Poll', description='3-question quick poll', type='SURVEY', reward_amount=25),
-                Task(title='Trial Signup', description='Sign up for free trial (no CC)', type='CPA', reward_amount=750, requires_verification=True),
-            ]
-            db.session.add_all(tasks)
+        # Seed rows are keyed on title, so re-running skips existing ones.
+        # Every dict carries the same keys so each table is one executemany.
+        tasks = [
+            dict(title='Watch 30s Video Ad', description='Watch a short advertisement', type='VIDEO', reward_amount=10, requires_verification=False),
+            dict(title='Install Partner App', description='Download and open our partner app', type='CPA', reward_amount=500, requires_verification=True),
+            dict(title='Complete Survey', description='Share your opinion in 5 minutes', type='SURVEY', reward_amount=50, requires_verification=False),
+            dict(title='Sign up for Newsletter', description='Subscribe to partner newsletter', type='CPA', reward_amount=100, requires_verification=True),
+            dict(title='Watch Premium Ad', description='Watch 60-second premium content', type='VIDEO', reward_amount=20, requires_verification=False),
+            dict(title='Install Game App', description='Install and reach level 5', type='CPA', reward_amount=1000, requires_verification=True),
+            dict(title='Quick Poll', description='3-question quick poll', type='SURVEY', reward_amount=25, requires_verification=False),
+            dict(title='Trial Signup', description='Sign up for free trial (no CC)', type='CPA', reward_amount=750, requires_verification=True),
+        ]
+        db.session.execute(insert_ignore(Task), tasks)
         
-        # Create seed shop items if none exist
-        if ShopItem.query.count() == 0:
-            items = [
-                ShopItem(title='$5 Amazon Gift Card', description='Instant digital delivery', price=1250, category='Gift Cards', image_url='https://images.unsplash.com/photo-1523474253046-8cd2748b5fd2?w=400'),
-                ShopItem(title='$10 Amazon Gift Card', description='Instant digital delivery', price=2500, category='Gift Cards', image_url='https://images.unsplash.com/photo-1523474253046-8cd2748b5fd2?w=400'),
-                ShopItem(title='$5 Starbucks eGift', description='Coffee on us!', price=1250, category='Gift Cards', image_url='https://images.unsplash.com/photo-1511920170033-f8396924c348?w=400'),
-                ShopItem(title='$10 iTunes Card', description='Music, apps, and more', price=2500, category='Gift Cards', image_url='https://images.unsplash.com/photo-1611162617213-7d7a39e9b1d7?w=400'),
-                ShopItem(title='Netflix 1 Month', description='Stream unlimited movies', price=2500, category='Subscriptions', image_url='https://images.unsplash.com/photo-1574375927938-d5a98e8ffe85?w=400'),
-                ShopItem(title='Spotify Premium 1 Month', description='30 days ad-free music', price=2000, category='Subscriptions', image_url='https://images.unsplash.com/photo-1614680376593-902f74cf0d41?w=400'),
-                ShopItem(title='$25 Visa Gift Card', description='Use anywhere Visa is accepted', price=6250, category='Gift Cards', image_url='https://images.unsplash.com/photo-1563013544-824ae1b704d3?w=400'),
-                ShopItem(title='Xbox Game Pass 1 Month', description='Access 100+ games', price=2500, category='Gaming', image_url='https://images.unsplash.com/photo-1622297845775-5ff3fef71d13?w=400'),
-            ]
-            db.session.add_all(items)
+        items = [
+            dict(title='$5 Amazon Gift Card', description='Instant digital delivery', price=1250, category='Gift Cards', image_url='https://images.unsplash.com/photo-1523474253046-8cd2748b5fd2?w=400'),
+            dict(title='$10 Amazon Gift Card', description='Instant digital delivery', price=2500, category='Gift Cards', image_url='https://images.unsplash.com/photo-1523474253046-8cd2748b5fd2?w=400'),
+            dict(title='$5 Starbucks eGift', description='Coffee on us!', price=1250, category='Gift Cards', image_url='https://images.unsplash.com/photo-1511920170033-f8396924c348?w=400'),
+            dict(title='$10 iTunes Card', description='Music, apps, and more', price=2500, category='Gift Cards', image_url='https://images.unsplash.com/photo-1611162617213-7d7a39e9b1d7?w=400'),
+            dict(title='Netflix 1 Month', description='Stream unlimited movies', price=2500, category='Subscriptions', image_url='https://images.unsplash.com/photo-1574375927938-d5a98e8ffe85?w=400'),
+            dict(title='Spotify Premium 1 Month', description='30 days ad-free music', price=2000, category='Subscriptions', image_url='https://images.unsplash.com/photo-1614680376593-902f74cf0d41?w=400'),
+            dict(title='$25 Visa Gift Card', description='Use anywhere Visa is accepted', price=6250, category='Gift Cards', image_url='https://images.unsplash.com/photo-1563013544-824ae1b704d3?w=400'),
+            dict(title='Xbox Game Pass 1 Month', description='Access 100+ games', price=2500, category='Gaming', image_url='https://images.unsplash.com/photo-1622297845775-5ff3fef71d13?w=400'),
+        ]
+        db.session.execute(insert_ignore(ShopItem), items)
+        
+        # Store the id-based avatar legacy accounts already show, so readers never build fallbacks
+        backfilled_ids = db.session.execute(
+            update(User)
+            .where(User.avatar_url.is_(None))
+            .values(avatar_url=literal(AVATAR_URL_PREFIX) + cast(User.id, db.String))
+            .returning(User.id)
+            .execution_options(synchronize_session=False)
+        ).scalars().all()
         
         db.session.commit()
+        invalidate_catalog()
+        warm_catalog_cache()
+        if backfilled_ids:
+            cache_delete(LEADERBOARD_CACHE_KEY, *(f'user:{user_id}' for user_id in backfilled_ids))
         print("✅ Database initialized with seed data")
 
 
+@app.cli.command('init-db')
+def init_db_command():
+    """Create tables and seed data: flask --app app init-db"""
+    init_db()
+
+
 # ============================================
 # RUN APPLICATION
 # ============================================
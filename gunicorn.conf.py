@@ -0,0 +1,15 @@
+"""
+Gunicorn settings for production (loaded by the Procfile)
+"""
+
+import os
+
+# Threaded workers. Each one holds its own DB pool (see SQLALCHEMY_ENGINE_OPTIONS in
+# app.py), so raise WEB_CONCURRENCY only with memory and max_connections to spare.
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", 8))
+
+# Import the app once in the master so workers share its memory copy-on-write.
+# Nothing may open DB or Redis connections at import time.
+preload_app = True
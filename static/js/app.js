@@ -48,6 +48,14 @@ async function apiCall(endpoint, method = 'GET', data = null) {
     
     try {
         const response = await fetch(`${API_BASE}${endpoint}`, options);
+        
+        // Session expired: send the user back to sign in (auth calls handle 401 themselves)
+        if (response.status === 401 && !endpoint.startsWith('/auth/')) {
+            window.location.href = '/auth';
+            // Never settle, so callers don't touch the missing result before navigation
+            return new Promise(() => {});
+        }
+        
         const result = await response.json();
         
         if (!response.ok) {